@@ -12,37 +12,110 @@ Usage examples:
     -H "Content-Type: application/json" \
     -d '{"texts": ["injection moulding operator", "lathe fitter"]}'
 
+  # Generate embeddings as raw little-endian float16 bytes
+  curl -X POST http://127.0.0.1:8000/embed \
+    -H "Content-Type: application/json" \
+    -H "Accept: application/octet-stream" \
+    -d '{"texts": ["injection moulding operator"]}' -o vectors.f16
+
   # Score similarity pairs
   curl -X POST http://127.0.0.1:8000/score \
     -H "Content-Type: application/json" \
     -d '{"pairs": [{"user_vec": [0.1, 0.2], "item_vec": [0.3, 0.4]}]}'
+
+  # Score one user vector against many items
+  curl -X POST http://127.0.0.1:8000/score/one-to-many \
+    -H "Content-Type: application/json" \
+    -d '{"user_vec": [0.1, 0.2], "item_vecs": [[0.3, 0.4], [0.5, 0.6]]}'
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 from typing import List, Optional, Literal
 import time
 import os
 import numpy as np
+import orjson
+
+from utils import (
+    get_model, cosine_similarity_batch, dot_product_batch,
+    cosine_similarity_one_to_many, dot_product_one_to_many, intra_op_threads, time_ms
+)
 
-from utils import get_model, cosine_similarity, dot_product, time_ms
+# Maximum number of texts, pairs or candidates per request
+MAX_BATCH = 512
 
 # Global ranker model cache
+RANKER_NUM_FEATURES = 4
+
 _ranker_model = None
 _ranker_session = None
+_ranker_input_name = None
+_ranker_output_name = None
+_ranker_output_zipmap = False
+_ranker_dmatrix = None
+
+def _load_ranker_session(ort, model_path):
+    """Create a ranker session, preferring the graph pre-optimized by train_ranker.py"""
+    optimized_path = os.path.splitext(model_path)[0] + '.opt.onnx'
+    
+    # The pre-optimized graph needs no runtime optimization
+    if os.path.exists(optimized_path):
+        model_path = optimized_path
+        optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+    elif os.path.exists(model_path):
+        optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    else:
+        return None
+    
+    print(f"Loading ONNX ranker from: {model_path}")
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = intra_op_threads()
+    opts.inter_op_num_threads = 1
+    opts.graph_optimization_level = optimization_level
+    opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    opts.enable_cpu_mem_arena = True
+    return ort.InferenceSession(
+        model_path,
+        sess_options=opts,
+        providers=['CPUExecutionProvider']
+    )
 
 def get_ranker():
     """Lazy-load the ONNX ranker model"""
-    global _ranker_model, _ranker_session
+    global _ranker_model, _ranker_session, _ranker_input_name
+    global _ranker_output_name, _ranker_output_zipmap, _ranker_dmatrix
     
     if _ranker_model is None:
+        # Prefer the Treelite-compiled library, which specializes on the tree structure
+        try:
+            import treelite_runtime
+            libpath = './models/ranker.so'
+            
+            if os.path.exists(libpath):
+                print(f"Loading Treelite ranker from: {libpath}")
+                _ranker_session = treelite_runtime.Predictor(libpath)
+                _ranker_dmatrix = treelite_runtime.DMatrix
+                _ranker_model = "treelite"
+                print("✅ Treelite ranker loaded successfully")
+                return _ranker_model, _ranker_session
+        except Exception as e:
+            print(f"Failed to load Treelite ranker: {e}, trying ONNX")
+        
         try:
             import onnxruntime as ort
             model_path = './models/ranker.onnx'
+            _ranker_session = _load_ranker_session(ort, model_path)
             
-            if os.path.exists(model_path):
-                print(f"Loading ONNX ranker from: {model_path}")
-                _ranker_session = ort.InferenceSession(model_path)
+            if _ranker_session is not None:
+                _ranker_input_name = _ranker_session.get_inputs()[0].name
+                
+                # Score with the positive-class probability, as Treelite does, not the label
+                probabilities = _ranker_session.get_outputs()[1]
+                _ranker_output_name = probabilities.name
+                _ranker_output_zipmap = probabilities.type.startswith('seq')
                 _ranker_model = "onnx"
                 print("✅ ONNX ranker loaded successfully")
             else:
@@ -54,10 +127,21 @@ def get_ranker():
     
     return _ranker_model, _ranker_session
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load and warm up models at startup so the first request doesn't pay for it"""
+    try:
+        get_model().encode(["warmup"], convert_to_numpy=True)
+    except Exception as e:
+        print(f"Failed to warm up embedding model: {e}")
+    get_ranker()
+    yield
+
 app = FastAPI(
     title="Vyaamik Samadhaan ML Service",
     description="Text embeddings and similarity scoring for job matching",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Request/Response models
@@ -69,6 +153,7 @@ class EmbedResponse(BaseModel):
     vectors: List[List[float]] = Field(..., description="Embedding vectors")
     dims: int = Field(..., description="Dimension of each vector")
     model: str = Field(..., description="Model name used")
+    normalized: bool = Field(..., description="Whether the vectors are L2-normalized")
     took_ms: int = Field(..., description="Processing time in milliseconds")
 
 class VectorPair(BaseModel):
@@ -78,13 +163,20 @@ class VectorPair(BaseModel):
 class ScoreRequest(BaseModel):
     pairs: List[VectorPair] = Field(..., min_items=1, max_items=512, description="Pairs of vectors to score")
     method: Literal["cosine", "dot"] = Field("cosine", description="Similarity method")
+    assume_normalized: bool = Field(False, description="Vectors are already L2-normalized; cosine is computed as dot")
+
+class OneToManyRequest(BaseModel):
+    user_vec: List[float] = Field(..., description="User embedding vector")
+    item_vecs: List[List[float]] = Field(..., min_items=1, max_items=512, description="Item embedding vectors")
+    method: Literal["cosine", "dot"] = Field("cosine", description="Similarity method")
+    assume_normalized: bool = Field(False, description="Vectors are already L2-normalized; cosine is computed as dot")
 
 class ScoreResponse(BaseModel):
     scores: List[float] = Field(..., description="Similarity scores")
     took_ms: int = Field(..., description="Processing time in milliseconds")
 
 class RankRequest(BaseModel):
-    features: List[List[float]] = Field(..., min_items=1, max_items=512, description="Feature vectors for ranking")
+    features: List[List[float]] = Field(..., min_items=1, max_items=MAX_BATCH, description="Feature vectors for ranking")
 
 class RankResponse(BaseModel):
     scores: List[float] = Field(..., description="Ranking scores")
@@ -101,8 +193,119 @@ class RankerHealthResponse(BaseModel):
     model: str
     dimsExpected: int
 
+# Vector-heavy routes parse the raw body with orjson + NumPy instead of having
+# Pydantic validate every float; the models above only document their schema
+
+async def read_body(request: Request) -> bytes:
+    """Read the raw request body on the event loop before the handler runs"""
+    return await request.body()
+
+def request_body_schema(model) -> dict:
+    """OpenAPI requestBody for a route that parses its body itself"""
+    schema = model.model_json_schema()
+    defs = schema.pop('$defs', {})
+    
+    def inline(node):
+        if isinstance(node, dict):
+            if '$ref' in node:
+                return inline(defs[node['$ref'].split('/')[-1]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+    
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": inline(schema)}}}}
+
+def parse_payload(body: bytes) -> dict:
+    """Parse a JSON object body, raising 422 on malformed input"""
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="Request body must be valid JSON")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=422, detail="Request body must be a JSON object")
+    return payload
+
+def parse_batch(payload: dict, field: str) -> list:
+    """Return payload[field], checking it is a list of 1 to MAX_BATCH items"""
+    items = payload.get(field)
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_BATCH:
+        raise HTTPException(
+            status_code=422,
+            detail=f"'{field}' must be a list of 1 to {MAX_BATCH} items"
+        )
+    return items
+
+def parse_method(payload: dict):
+    """Return the (method, assume_normalized) scoring options"""
+    method = payload.get("method", "cosine")
+    if method not in ("cosine", "dot"):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid method. Use 'cosine' or 'dot'"
+        )
+    assume_normalized = payload.get("assume_normalized", False)
+    if not isinstance(assume_normalized, bool):
+        raise HTTPException(status_code=422, detail="'assume_normalized' must be a boolean")
+    return method, assume_normalized
+
+def to_matrix(rows: list) -> np.ndarray:
+    """Stack equal-length numeric rows into an (N, D) float32 matrix"""
+    try:
+        # Values beyond float32 range become inf and are rejected below
+        with np.errstate(over='ignore'):
+            matrix = np.asarray(rows, dtype=np.float32)
+    except (TypeError, ValueError):
+        matrix = None
+    if matrix is None or matrix.ndim != 2:
+        raise HTTPException(
+            status_code=400,
+            detail="All vectors must be numeric and have the same dimensions"
+        )
+    # float32 conversion maps JSON null to NaN, so check finiteness explicitly
+    if matrix.shape[1] == 0 or not np.isfinite(matrix).all():
+        raise HTTPException(
+            status_code=400,
+            detail="Vectors must be non-empty and contain only finite numbers"
+        )
+    return matrix
+
+def media_type_quality(accept: str, media_type: str) -> float:
+    """
+    q-value the Accept header gives media_type, using its most specific
+    matching range (type/subtype, then type/*, then */*); 0 if none match
+    """
+    main_type = media_type.split("/")[0]
+    ranks = {media_type: 3, f"{main_type}/*": 2, "*/*": 1}
+    best_rank, best_q = 0, 0.0
+    for media_range in accept.split(","):
+        name, *params = [part.strip() for part in media_range.split(";")]
+        rank = ranks.get(name.lower(), 0)
+        if rank <= best_rank:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        best_rank, best_q = rank, q
+    return best_q
+
+def wants_octet_stream(accept: Optional[str]) -> bool:
+    """Whether the client explicitly prefers application/octet-stream over JSON"""
+    if not accept:
+        return False
+    # Only an explicit octet-stream range opts in; wildcards keep the JSON default
+    if "application/octet-stream" not in accept.lower():
+        return False
+    binary_q = media_type_quality(accept, "application/octet-stream")
+    return binary_q > 0 and binary_q > media_type_quality(accept, "application/json")
+
 @app.get("/health", response_model=HealthResponse)
-async def health_check():
+def health_check():
     """
     Health check endpoint
     """
@@ -120,10 +323,25 @@ async def health_check():
             ready=False
         )
 
-@app.post("/embed", response_model=EmbedResponse)
-async def embed_texts(request: EmbedRequest):
+@app.post(
+    "/embed",
+    response_model=EmbedResponse,
+    response_class=ORJSONResponse,
+    responses={200: {"content": {"application/octet-stream": {}}}}
+)
+def embed_texts(request: EmbedRequest, accept: Optional[str] = Header(None)):
     """
     Generate embeddings for a list of texts
+    
+    The float32 array is serialized directly by orjson rather than being
+    converted to Python lists and validated against EmbedResponse, which
+    only documents the response shape.
+    
+    With "Accept: application/octet-stream" (ranked above application/json
+    when both are listed) the vectors are returned as raw little-endian
+    float16 bytes instead, with the shape and metadata in
+    X-Count, X-Dims, X-Dtype, X-Model, X-Normalized and X-Took-Ms headers.
+    Decode with np.frombuffer(body, dtype='<f2').reshape(count, dims).
     """
     start_time = time_ms()
     
@@ -137,50 +355,83 @@ async def embed_texts(request: EmbedRequest):
             convert_to_numpy=True
         )
         
-        # Convert to list of lists
-        vectors = embeddings.tolist()
-        dims = len(vectors[0]) if vectors else 0
+        # orjson only serializes C-contiguous arrays
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        dims = embeddings.shape[1] if embeddings.ndim == 2 else 0
+        
+        model_name = model.model_name if hasattr(model, 'model_name') else 'paraphrase-multilingual-MiniLM-L12-v2'
+        
+        if wants_octet_stream(accept):
+            content = embeddings.astype('<f2').tobytes()
+            took_ms = time_ms() - start_time
+            return Response(
+                content=content,
+                media_type="application/octet-stream",
+                headers={
+                    "X-Count": str(embeddings.shape[0]),
+                    "X-Dims": str(dims),
+                    "X-Dtype": "float16",
+                    "X-Model": model_name,
+                    "X-Normalized": str(request.normalize).lower(),
+                    "X-Took-Ms": str(took_ms),
+                    "Vary": "Accept"
+                }
+            )
         
         took_ms = time_ms() - start_time
         
-        return EmbedResponse(
-            vectors=vectors,
-            dims=dims,
-            model=model.model_name if hasattr(model, 'model_name') else 'paraphrase-multilingual-MiniLM-L12-v2',
-            took_ms=took_ms
-        )
+        return ORJSONResponse({
+            "vectors": embeddings,
+            "dims": dims,
+            "model": model_name,
+            "normalized": request.normalize,
+            "took_ms": took_ms
+        }, headers={"Vary": "Accept"})
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Embedding generation failed: {str(e)}")
 
-@app.post("/score", response_model=ScoreResponse)
-async def score_pairs(request: ScoreRequest):
+@app.post("/score", response_model=ScoreResponse, openapi_extra=request_body_schema(ScoreRequest))
+def score_pairs(body: bytes = Depends(read_body)):
     """
     Compute similarity scores for pairs of vectors
+    
+    Vectors returned by /embed with normalized=true have unit length, so
+    their cosine similarity equals their dot product. Send such vectors
+    with method="dot" (or method="cosine" and assume_normalized=true) to
+    skip re-normalizing them.
     """
     start_time = time_ms()
     
     try:
-        scores = []
+        payload = parse_payload(body)
+        pairs = parse_batch(payload, "pairs")
+        method, assume_normalized = parse_method(payload)
         
-        for pair in request.pairs:
-            if len(pair.user_vec) != len(pair.item_vec):
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Vector dimensions must match"
-                )
-            
-            if request.method == "cosine":
-                score = cosine_similarity(pair.user_vec, pair.item_vec)
-            elif request.method == "dot":
-                score = dot_product(pair.user_vec, pair.item_vec)
-            else:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Invalid method. Use 'cosine' or 'dot'"
-                )
-            
-            scores.append(score)
+        if method == "cosine" and not assume_normalized:
+            score_batch = cosine_similarity_batch
+        else:
+            score_batch = dot_product_batch
+        
+        # Stack all pairs into two (N, D) matrices and score them in one pass
+        try:
+            user_vecs = [pair["user_vec"] for pair in pairs]
+            item_vecs = [pair["item_vec"] for pair in pairs]
+        except (KeyError, TypeError):
+            raise HTTPException(
+                status_code=422,
+                detail="Each pair must have 'user_vec' and 'item_vec'"
+            )
+        U = to_matrix(user_vecs)
+        V = to_matrix(item_vecs)
+        
+        if U.shape != V.shape:
+            raise HTTPException(
+                status_code=400, 
+                detail="Vector dimensions must match"
+            )
+        
+        scores = score_batch(U, V).tolist()
         
         took_ms = time_ms() - start_time
         
@@ -194,43 +445,104 @@ async def score_pairs(request: ScoreRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Scoring failed: {str(e)}")
 
-@app.post("/rank", response_model=RankResponse)
-async def rank_candidates(request: RankRequest):
+@app.post("/score/one-to-many", response_model=ScoreResponse, openapi_extra=request_body_schema(OneToManyRequest))
+def score_one_to_many(body: bytes = Depends(read_body)):
+    """
+    Compute similarity scores between one user vector and many item vectors
+    
+    Scores all items with a single matrix-vector product and normalizes
+    the user vector once, instead of repeating it per pair as /score does.
+    """
+    start_time = time_ms()
+    
+    try:
+        payload = parse_payload(body)
+        items = to_matrix(parse_batch(payload, "item_vecs"))
+        u = to_matrix([payload.get("user_vec")])[0]
+        method, assume_normalized = parse_method(payload)
+        
+        if method == "cosine" and not assume_normalized:
+            score_items = cosine_similarity_one_to_many
+        else:
+            score_items = dot_product_one_to_many
+        
+        if items.shape[1] != u.shape[0]:
+            raise HTTPException(
+                status_code=400,
+                detail="Vector dimensions must match"
+            )
+        
+        scores = score_items(u, items).tolist()
+        
+        took_ms = time_ms() - start_time
+        
+        return ScoreResponse(
+            scores=scores,
+            took_ms=took_ms
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Scoring failed: {str(e)}")
+
+@app.post("/rank", response_model=RankResponse, openapi_extra=request_body_schema(RankRequest))
+def rank_candidates(body: bytes = Depends(read_body)):
     """
     Re-rank candidates using ML model or fallback
     """
     start_time = time_ms()
     
     try:
+        features_batch = parse_batch(parse_payload(body), "features")
         model_type, session = get_ranker()
         
-        if model_type == "onnx" and session is not None:
-            # Use ONNX model
-            features_array = np.array(request.features, dtype=np.float32)
-            
-            # Get input name (usually 'input' or first input)
-            input_name = session.get_inputs()[0].name
+        if model_type in ("treelite", "onnx") and session is not None:
+            # Build the model input, rejecting ragged rows, nulls and non-finite values.
+            # A fresh C-contiguous float32 array is what both runtimes expect,
+            # so ONNX Runtime and Treelite read it without converting it again
+            n = len(features_batch)
+            try:
+                features = np.asarray(features_batch, dtype=np.float32)
+            except (TypeError, ValueError):
+                features = None
+            if features is None or features.shape != (n, RANKER_NUM_FEATURES) or not np.isfinite(features).all():
+                raise HTTPException(
+                    status_code=400,
+                    detail="Expected 4 numeric features per candidate"
+                )
             
             # Run inference
-            scores = session.run(None, {input_name: features_array})[0]
-            scores = scores.flatten().tolist()
+            if model_type == "onnx":
+                probabilities = session.run([_ranker_output_name], {_ranker_input_name: features})[0]
+                if _ranker_output_zipmap:
+                    # Models exported before zipmap=False return one {class: prob} map per row
+                    scores = [row[1] for row in probabilities]
+                else:
+                    scores = probabilities[:, 1].tolist()
+            else:
+                scores = session.predict(_ranker_dmatrix(features)).flatten().tolist()
             
         else:
             # Fallback: simple linear combination
-            # Default weights: [similarity, recency, trust, geo]
-            weights = [1.0, 0.2, 0.2, 0.2]  # Documented fallback weights
-            
+            # Default weights: [similarity, recency, trust, geo] = [1.0, 0.2, 0.2, 0.2]
             scores = []
-            for features in request.features:
-                if len(features) != 4:
+            for features in features_batch:
+                if not isinstance(features, list) or len(features) != 4:
                     raise HTTPException(
                         status_code=400,
                         detail="Expected 4 features per candidate"
                     )
                 
-                # Linear combination
-                score = sum(w * f for w, f in zip(weights, features))
-                scores.append(score)
+                # Linear combination, unrolled for the fixed 4 features
+                f0, f1, f2, f3 = features
+                try:
+                    scores.append(f0 + 0.2 * f1 + 0.2 * f2 + 0.2 * f3)
+                except TypeError:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="Features must be numeric"
+                    )
         
         took_ms = time_ms() - start_time
         
@@ -246,7 +558,7 @@ async def rank_candidates(request: RankRequest):
         raise HTTPException(status_code=500, detail=f"Ranking failed: {str(e)}")
 
 @app.get("/ranker/health", response_model=RankerHealthResponse)
-async def ranker_health():
+def ranker_health():
     """
     Ranker health check endpoint
     """
@@ -266,4 +578,16 @@ async def ranker_health():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    
+    # Each worker process loads its own models after startup via lifespan,
+    # since ORT sessions are not fork-safe for every execution provider
+    cpu_count = os.cpu_count() or 1
+    workers = max(1, int(os.getenv("ML_WORKERS", max(1, cpu_count // 2))))
+    
+    # Split the cores between workers instead of every worker using all of them
+    os.environ.setdefault("ORT_INTRA_THREADS", str(max(1, cpu_count // workers)))
+    
+    if workers > 1:
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8000)
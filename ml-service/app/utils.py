@@ -1,24 +1,174 @@
 """
 Utility functions for ML service
 """
+import math
+import os
 import time
 import numpy as np
-from typing import List, Optional
+from typing import List, Optional, Union
 from sentence_transformers import SentenceTransformer
 
+# SimSIMD provides AVX-512/NEON similarity kernels; fall back to NumPy without it
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+# Without SimSIMD, batched scoring uses Numba kernels, which beat NumPy for small D
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Serial kernels: handlers already run concurrently in the threadpool, and numba's
+# parallel thread pool is not safe to enter from several threads at once
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def cosine_batch(U, V, out):
+        for i in range(U.shape[0]):
+            s = 0.0
+            a = 0.0
+            b = 0.0
+            for k in range(U.shape[1]):
+                s += U[i, k] * V[i, k]
+                a += U[i, k] * U[i, k]
+                b += V[i, k] * V[i, k]
+            out[i] = s / math.sqrt(a * b + 1e-12)
+    
+    @njit(fastmath=True, cache=True)
+    def dot_batch(U, V, out):
+        for i in range(U.shape[0]):
+            s = 0.0
+            for k in range(U.shape[1]):
+                s += U[i, k] * V[i, k]
+            out[i] = s
+    
+    # Compile for float32 at import so the first request doesn't pay JIT cost
+    if simsimd is None:
+        _warmup = np.zeros((1, 4), dtype=np.float32)
+        cosine_batch(_warmup, _warmup, np.zeros(1, dtype=np.float32))
+        dot_batch(_warmup, _warmup, np.zeros(1, dtype=np.float32))
+
+MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+ENCODER_DIR = './models/encoder'
+ENCODER_FILES = ('encoder.int8.onnx', 'encoder.onnx')
+
+def intra_op_threads() -> int:
+    """
+    Threads per inference call, from ORT_INTRA_THREADS or the CPU count
+    """
+    return int(os.getenv('ORT_INTRA_THREADS', os.cpu_count() or 1))
+
+def cuda_enabled() -> bool:
+    """
+    Whether ORT_USE_CUDA=1 is set and onnxruntime-gpu provides the CUDA EP
+    """
+    if os.getenv('ORT_USE_CUDA') != '1':
+        return False
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        return False
+    return 'CUDAExecutionProvider' in ort.get_available_providers()
+
+def encoder_providers() -> list:
+    """
+    ONNX Runtime providers for the encoder, CUDA first when enabled
+    Token shapes vary per request, so CUDA graph capture is not used
+    """
+    providers = ['CPUExecutionProvider']
+    if cuda_enabled():
+        providers.insert(0, ('CUDAExecutionProvider', {
+            'device_id': int(os.getenv('ORT_CUDA_DEVICE', '0')),
+            'cudnn_conv_algo_search': 'HEURISTIC'
+        }))
+    return providers
+
+class OnnxEncoder:
+    """
+    ONNX Runtime encoder exported by scripts/export_encoder.py
+    Mirrors the subset of SentenceTransformer.encode used by the service
+    """
+    def __init__(self, model_dir: str, model_file: str = 'encoder.onnx', max_length: int = 128):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = intra_op_threads()
+        
+        self.model_name = MODEL_NAME
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            sess_options=opts,
+            providers=encoder_providers()
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+    
+    def encode(self, texts: List[str], normalize_embeddings: bool = False,
+               convert_to_numpy: bool = True, batch_size: int = 32) -> np.ndarray:
+        batches = []
+        for i in range(0, len(texts), batch_size):
+            encoded = self.tokenizer(
+                texts[i:i + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors='np'
+            )
+            # The XLM-R tokenizer returns no token_type_ids for this BERT graph; feed zeros
+            input_ids = encoded['input_ids']
+            feeds = {
+                name: np.asarray(encoded[name] if name in encoded else np.zeros_like(input_ids), dtype=np.int64)
+                for name in self.input_names
+            }
+            token_embeddings = self.session.run(None, feeds)[0]
+            
+            # Mean pooling over non-padding tokens
+            mask = encoded['attention_mask'][..., None].astype(np.float32)
+            summed = (token_embeddings * mask).sum(axis=1)
+            batches.append(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+        
+        embeddings = np.concatenate(batches).astype(np.float32)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
 # Global model cache
-_model: Optional[SentenceTransformer] = None
+_model: Optional[Union[OnnxEncoder, SentenceTransformer]] = None
 
-def get_model() -> SentenceTransformer:
+def get_model() -> Union[OnnxEncoder, SentenceTransformer]:
     """
     Lazy-load the sentence transformer model
+    Prefers the exported ONNX encoder and falls back to PyTorch
     Returns the cached model or loads it on first call
     """
     global _model
     if _model is None:
         print("Loading sentence transformer model...")
         start_time = time.time()
-        _model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        
+        # Prefer the INT8 encoder, which export_encoder.py only keeps if it passes the drift check.
+        # Its dynamically quantized ops run on CPU only, so prefer FP32 on GPU.
+        encoder_files = ENCODER_FILES[::-1] if cuda_enabled() else ENCODER_FILES
+        for model_file in encoder_files:
+            if not os.path.exists(os.path.join(ENCODER_DIR, model_file)):
+                continue
+            try:
+                _model = OnnxEncoder(ENCODER_DIR, model_file)
+                print(f"✅ ONNX encoder loaded from: {os.path.join(ENCODER_DIR, model_file)}")
+                break
+            except Exception as e:
+                print(f"Failed to load ONNX encoder {model_file}: {e}")
+        
+        if _model is None:
+            print("No ONNX encoder available, using sentence-transformers")
+            import torch
+            torch.set_num_threads(intra_op_threads())
+            _model = SentenceTransformer(MODEL_NAME)
+        
         load_time = (time.time() - start_time) * 1000
         print(f"Model loaded in {load_time:.2f}ms")
     return _model
@@ -27,25 +177,86 @@ def cosine_similarity(a: List[float], b: List[float]) -> float:
     """
     Compute cosine similarity between two vectors
     """
-    a_np = np.array(a)
-    b_np = np.array(b)
+    if simsimd is not None:
+        # simsimd.cosine returns the cosine distance
+        return 1 - float(simsimd.cosine(
+            np.ascontiguousarray(a, dtype=np.float32),
+            np.ascontiguousarray(b, dtype=np.float32)
+        ))
     
-    # Normalize vectors
-    a_norm = a_np / np.linalg.norm(a_np)
-    b_norm = b_np / np.linalg.norm(b_np)
+    a_np = np.asarray(a, dtype=np.float32)
+    b_np = np.asarray(b, dtype=np.float32)
     
-    return float(np.dot(a_norm, b_norm))
+    # Single sqrt over both squared norms; epsilon guards zero vectors
+    return float(np.dot(a_np, b_np) / np.sqrt(np.vdot(a_np, a_np) * np.vdot(b_np, b_np) + 1e-12))
 
 def dot_product(a: List[float], b: List[float]) -> float:
     """
     Compute dot product between two vectors
     """
+    if simsimd is not None:
+        return float(simsimd.dot(
+            np.ascontiguousarray(a, dtype=np.float32),
+            np.ascontiguousarray(b, dtype=np.float32)
+        ))
+    
     a_np = np.array(a)
     b_np = np.array(b)
     return float(np.dot(a_np, b_np))
 
+def cosine_similarity_batch(U: np.ndarray, V: np.ndarray) -> np.ndarray:
+    """
+    Compute row-wise cosine similarity between two (N, D) matrices
+    """
+    if simsimd is not None:
+        # Row-wise cosine distances for two 2D inputs
+        return 1 - np.asarray(simsimd.cosine(
+            np.ascontiguousarray(U, dtype=np.float32),
+            np.ascontiguousarray(V, dtype=np.float32)
+        ))
+    
+    if njit is not None:
+        out = np.empty(U.shape[0], dtype=np.float32)
+        cosine_batch(U, V, out)
+        return out
+    
+    # Same zero-norm epsilon as cosine_similarity
+    UU = np.einsum('ij,ij->i', U, U)
+    VV = np.einsum('ij,ij->i', V, V)
+    return np.einsum('ij,ij->i', U, V) / np.sqrt(UU * VV + 1e-12)
+
+def dot_product_batch(U: np.ndarray, V: np.ndarray) -> np.ndarray:
+    """
+    Compute row-wise dot product between two (N, D) matrices
+    """
+    if simsimd is not None:
+        return np.asarray(simsimd.dot(
+            np.ascontiguousarray(U, dtype=np.float32),
+            np.ascontiguousarray(V, dtype=np.float32)
+        ))
+    
+    if njit is not None:
+        out = np.empty(U.shape[0], dtype=np.float32)
+        dot_batch(U, V, out)
+        return out
+    
+    return np.einsum('ij,ij->i', U, V)
+
+def cosine_similarity_one_to_many(u: np.ndarray, items: np.ndarray) -> np.ndarray:
+    """
+    Compute cosine similarity between one (D,) vector and each row of an (N, D) matrix
+    """
+    # One GEMV for the dot products; the user norm is computed once
+    return (items @ u) / np.sqrt(np.einsum('ij,ij->i', items, items) * np.vdot(u, u) + 1e-12)
+
+def dot_product_one_to_many(u: np.ndarray, items: np.ndarray) -> np.ndarray:
+    """
+    Compute dot product between one (D,) vector and each row of an (N, D) matrix
+    """
+    return items @ u
+
 def time_ms() -> int:
     """
-    Get current time in milliseconds
+    Get a monotonic timestamp in milliseconds, for measuring elapsed time only
     """
-    return int(time.time() * 1000)
+    return time.perf_counter_ns() // 1_000_000
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Encoder Export Script
+
+Exports the sentence-transformer encoder to ONNX so the service can run it
+with ONNX Runtime instead of PyTorch.
+
+Output directory layout:
+- encoder.onnx: transformer graph producing token embeddings
+- encoder.int8.onnx: dynamically quantized INT8 graph, kept only if its
+  embeddings stay within --max-drift cosine distance of encoder.onnx
+- tokenizer files: loaded with transformers.AutoTokenizer at serve time
+
+Usage:
+    python scripts/export_encoder.py --out models/encoder
+    python scripts/export_encoder.py --out models/encoder --eval-texts heldout.txt
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+from optimum.onnxruntime import ORTModelForFeatureExtraction
+from transformers import AutoTokenizer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from utils import OnnxEncoder
+
+DEFAULT_MODEL_ID = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+
+# Held-out texts for the INT8 drift check when --eval-texts is not given
+DEFAULT_EVAL_TEXTS = [
+    'injection moulding operator',
+    'lathe fitter',
+    'CNC machine operator with 5 years experience',
+    'welder needed for night shift',
+    'electrician for factory maintenance',
+    'warehouse helper, loading and unloading',
+    'sewing machine operator in garment unit',
+    'वेल्डर की नौकरी',
+    'फैक्ट्री में हेल्पर चाहिए',
+    'ड्राइवर, भारी वाहन लाइसेंस',
+]
+
+def export_encoder(model_id, output_dir):
+    """Export the Hugging Face model and tokenizer to ONNX"""
+    print(f"Exporting {model_id} to ONNX: {output_dir}")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        model = ORTModelForFeatureExtraction.from_pretrained(model_id, export=True)
+        model.save_pretrained(tmp_dir)
+        shutil.move(os.path.join(tmp_dir, 'model.onnx'), os.path.join(output_dir, 'encoder.onnx'))
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    tokenizer.save_pretrained(output_dir)
+
+    output_path = os.path.join(output_dir, 'encoder.onnx')
+    print(f"✅ ONNX encoder saved to: {output_path}")
+
+    # Verify the model can be loaded
+    try:
+        import onnxruntime as ort
+        session = ort.InferenceSession(output_path, providers=['CPUExecutionProvider'])
+        print(f"✅ ONNX encoder verification successful")
+        print(f"   Inputs: {[i.name for i in session.get_inputs()]}")
+        print(f"   Output shape: {session.get_outputs()[0].shape}")
+    except Exception as e:
+        print(f"⚠️  ONNX encoder verification failed: {e}")
+
+    # Run the serving path end to end so a broken export fails here, not on first /embed
+    embeddings = OnnxEncoder(output_dir, 'encoder.onnx').encode([DEFAULT_EVAL_TEXTS[0]], normalize_embeddings=True)
+    print(f"✅ Test encode successful, embedding shape: {embeddings.shape}")
+
+    return output_path
+
+def quantize_encoder(output_dir, eval_texts, max_drift):
+    """Quantize encoder.onnx to INT8 and keep it only if embedding drift is acceptable"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    fp32_path = os.path.join(output_dir, 'encoder.onnx')
+    int8_path = os.path.join(output_dir, 'encoder.int8.onnx')
+    print(f"\nQuantizing encoder to INT8: {int8_path}")
+
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"✅ INT8 encoder saved to: {int8_path}")
+    print(f"   Size: {os.path.getsize(fp32_path) / 1e6:.1f}MB -> {os.path.getsize(int8_path) / 1e6:.1f}MB")
+
+    # Compare normalized embeddings from both graphs on the held-out texts
+    fp32 = OnnxEncoder(output_dir, 'encoder.onnx').encode(eval_texts, normalize_embeddings=True)
+    int8 = OnnxEncoder(output_dir, 'encoder.int8.onnx').encode(eval_texts, normalize_embeddings=True)
+    drift = 1 - np.einsum('ij,ij->i', fp32, int8)
+
+    print(f"   Cosine drift on {len(eval_texts)} texts: mean {drift.mean():.2e}, max {drift.max():.2e}")
+
+    if drift.max() >= max_drift:
+        os.remove(int8_path)
+        print(f"⚠️  Max drift {drift.max():.2e} exceeds {max_drift:.0e}, removed INT8 encoder")
+        return None
+
+    return int8_path
+
+def main():
+    parser = argparse.ArgumentParser(description='Export sentence-transformer encoder to ONNX')
+    parser.add_argument('--model', default=DEFAULT_MODEL_ID, help=f'Hugging Face model id (default: {DEFAULT_MODEL_ID})')
+    parser.add_argument('--out', default='models/encoder', help='Output directory (default: models/encoder)')
+    parser.add_argument('--eval-texts', help='Held-out texts for the INT8 drift check, one per line')
+    parser.add_argument('--max-drift', type=float, default=1e-3, help='Max allowed cosine drift for INT8 (default: 1e-3)')
+    parser.add_argument('--no-quantize', action='store_true', help='Skip INT8 quantization')
+
+    args = parser.parse_args()
+
+    try:
+        export_encoder(args.model, args.out)
+
+        if not args.no_quantize:
+            if args.eval_texts:
+                with open(args.eval_texts, encoding='utf-8') as f:
+                    eval_texts = [line.strip() for line in f if line.strip()]
+            else:
+                eval_texts = DEFAULT_EVAL_TEXTS
+            quantize_encoder(args.out, eval_texts, args.max_drift)
+
+        print(f"\n🎉 Export completed successfully!")
+
+    except Exception as e:
+        print(f"❌ Export failed: {e}")
+        return 1
+
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
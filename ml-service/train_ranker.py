@@ -2,7 +2,8 @@
 """
 Ranker Training Script
 
-Trains a LightGBM binary classifier for candidate re-ranking and exports to ONNX.
+Trains a LightGBM binary classifier for candidate re-ranking and exports to ONNX,
+plus a Treelite-compiled shared library (ranker.so) next to the ONNX output.
 
 Expected CSV format:
 - label: 0 (negative) or 1 (positive)
@@ -110,39 +111,69 @@ def train_model(X, y, test_size=0.2, random_state=42):
     
     return model
 
-def export_to_onnx(model, output_path):
-    """Export LightGBM model to ONNX"""
-    print(f"\nExporting model to ONNX: {output_path}")
-    
-    # Create output directory if it doesn't exist
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Convert to ONNX
+def convert_to_onnx(model):
+    """Convert LightGBM model to ONNX"""
     # Define input shape: [None, 4] for 4 features
     initial_type = [('input', onnxmltools.convert.common.data_types.FloatTensorType([None, 4]))]
     
-    onnx_model = convert_lightgbm(
+    # zipmap=False keeps probabilities as an (N, 2) tensor the server can slice
+    return convert_lightgbm(
         model,
         initial_types=initial_type,
-        target_opset=11
+        target_opset=11,
+        zipmap=False
     )
-    
-    # Save ONNX model
+
+def save_onnx(onnx_model, output_path):
+    """Save an ONNX model and write its pre-optimized graph alongside it"""
     with open(output_path, 'wb') as f:
         f.write(onnx_model.SerializeToString())
     
     print(f"✅ ONNX model saved to: {output_path}")
     
-    # Verify the model can be loaded
+    # Verify the model can be loaded, saving the fully optimized graph alongside it
     try:
         import onnxruntime as ort
-        session = ort.InferenceSession(output_path)
+        optimized_path = os.path.splitext(output_path)[0] + '.opt.onnx'
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.optimized_model_filepath = optimized_path
+        session = ort.InferenceSession(output_path, sess_options=opts, providers=['CPUExecutionProvider'])
         print(f"✅ ONNX model verification successful")
         print(f"   Input shape: {session.get_inputs()[0].shape}")
         print(f"   Output shape: {session.get_outputs()[0].shape}")
+        print(f"✅ Optimized ONNX model saved to: {optimized_path}")
     except Exception as e:
         print(f"⚠️  ONNX model verification failed: {e}")
 
+def export_to_onnx(model, output_path):
+    """Export LightGBM model to ONNX"""
+    print(f"\nExporting model to ONNX: {output_path}")
+    
+    # Create output directory if it doesn't exist
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    save_onnx(convert_to_onnx(model), output_path)
+
+def export_to_treelite(model, libpath):
+    """Compile LightGBM model to a native shared library with Treelite"""
+    print(f"\nCompiling model with Treelite: {libpath}")
+    
+    try:
+        import treelite
+        import treelite_runtime
+        
+        tl_model = treelite.Model.from_lightgbm(model)
+        tl_model.export_lib(toolchain='gcc', libpath=libpath, params={'parallel_comp': 4})
+        print(f"✅ Treelite library saved to: {libpath}")
+        
+        # Verify the library can be loaded
+        predictor = treelite_runtime.Predictor(libpath)
+        print(f"✅ Treelite library verification successful")
+        print(f"   Features: {predictor.num_feature}")
+    except Exception as e:
+        print(f"⚠️  Treelite compilation failed: {e}, server will use ONNX")
+
 def main():
     parser = argparse.ArgumentParser(description='Train ranker model')
     parser.add_argument('--csv', required=True, help='Path to training CSV file')
@@ -165,6 +196,9 @@ def main():
         # Export to ONNX
         export_to_onnx(model, args.out)
         
+        # Compile native library, preferred over ONNX by the server
+        export_to_treelite(model, os.path.join(os.path.dirname(args.out), 'ranker.so'))
+        
         print(f"\n🎉 Training completed successfully!")
         print(f"Model saved to: {args.out}")
         